@@ -1,4 +1,5 @@
 import re
+import ipaddress
 import requests
 from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
@@ -9,8 +10,9 @@ M3U8_SOURCES_FILE = "m3u8_sources.txt"
 IPTV_SOURCES_FILE = "iptv_sources.txt"
 OUTPUT_PLAYLIST_FILE = "iptv_playlist.m3u8"
 # 黑名单：过滤失效域名、违规协议、无效链接
-BLACK_DOMAIN = {"vip.lzcdn2.com", "vip1.lz-cdn1.com"}  # 报错CDN域名
+BLACK_DOMAIN = {"vip.lzcdn2.com", "vip1.lz-cdn1.com"}  # 报错CDN域名（后缀匹配，含子域名）
 BLACK_PROTOCOL = {"p2p", "rtmp", "udp"}               # 不支持的协议
+BLACK_CIDR = set()                                    # 拉黑IP段，如 "10.0.0.0/8"
 # 正则规则
 CHANNEL_PATTERN = re.compile(r'(cctv\d+|CCTV\d+|卫视|电台|新闻)', re.IGNORECASE)
 URL_PATTERN = re.compile(r'https?://[^\s]+', re.IGNORECASE)
@@ -24,20 +26,57 @@ def requests_retry_session(retries=3, backoff_factor=0.3):
     session.mount("https", adapter)
     return session
 
+def build_domain_trie(domains):
+    """域名后缀树：按标签逆序建树，命中任一终止节点即视为拉黑（覆盖子域名）"""
+    trie = {}
+    for domain in domains:
+        node = trie
+        for label in reversed(domain.lower().strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node[""] = True
+    return trie
+
+def build_networks(cidrs):
+    """编译IP段，无效规则跳过"""
+    networks = []
+    for cidr in cidrs:
+        try:
+            networks.append(ipaddress.ip_network(cidr, strict=False))
+        except ValueError:
+            print(f"无效的CIDR规则，已跳过：{cidr}")
+    return networks
+
+# 预编译匹配器（模块加载时构建一次）
+BLACK_PROTOCOL_SET = frozenset(BLACK_PROTOCOL)
+BLACK_DOMAIN_TRIE = build_domain_trie(BLACK_DOMAIN)
+BLACK_NETWORKS = build_networks(BLACK_CIDR)
+
 def is_valid_url(link):
-    """校验链接：过滤黑名单协议、域名"""
-    link_lower = link.lower()
-    # 过滤协议
-    for proto in BLACK_PROTOCOL:
-        if link_lower.startswith(f"{proto}://") or link_lower.startswith(f"{proto}/"):
-            return False
-    # 过滤黑名单域名
+    """校验链接：过滤黑名单协议、域名（含子域名）、IP段"""
+    # 过滤协议（兼容 rtmp://xxx 与 p2p/xxx 两种写法）
+    scheme = link.split("://", 1)[0] if "://" in link else link.split("/", 1)[0]
+    if scheme.lower() in BLACK_PROTOCOL_SET:
+        return False
     try:
-        domain = urlparse(link).netloc
-        if domain in BLACK_DOMAIN:
-            return False
-    except:
+        host = (urlparse(link).hostname or "").rstrip(".")  # 兼容 FQDN 末尾的点
+    except ValueError:
+        return False
+    if not host:
         return False
+    # 过滤黑名单IP段 / 域名后缀
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        ip = None
+    if ip is not None:
+        return not any(ip in net for net in BLACK_NETWORKS if net.version == ip.version)
+    node = BLACK_DOMAIN_TRIE
+    for label in reversed(host.split(".")):
+        node = node.get(label)
+        if node is None:
+            break
+        if "" in node:
+            return False
     return True
 
 def read_m3u8_sources(file_path):
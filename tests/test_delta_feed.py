@@ -0,0 +1,78 @@
+"""增量变更推送本地验证：快照比较、序号递增、写入失败与变更流领先快照时的恢复"""
+import importlib.util
+import json
+import socket
+from pathlib import Path
+
+import pytest
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "备用.py"
+
+
+@pytest.fixture
+def crawler(monkeypatch, tmp_path):
+    """每个用例加载一份独立的脚本模块，快照与变更流写入临时目录"""
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("backup_crawler", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    socket.getaddrinfo = module.SYSTEM_GETADDRINFO
+
+
+def read_json(crawler, key):
+    return json.loads(Path(crawler.CONFIG[key]).read_text(encoding="utf-8"))
+
+
+def test_diff_channels_reports_each_kind_of_change(crawler):
+    old = {"CCTV1": ["a", "b", "c"], "CCTV2": ["x"]}
+    new = {"CCTV1": ["b", "a", "d"], "CCTV5": ["y"]}
+    patch, changes = crawler.diff_channels(old, new)
+
+    assert changes == {
+        "channels_added": ["CCTV5"],
+        "channels_removed": ["CCTV2"],
+        "added": [["CCTV1", "d", 3]],
+        "promoted": [["CCTV1", "b", 2, 1]],
+        "demoted": [["CCTV1", "a", 1, 2]],
+        "dropped": [["CCTV1", "c", 3]],
+    }
+    assert crawler.apply_patch(old, patch) == new
+
+
+def test_diff_channels_no_change(crawler):
+    channels = {"CCTV1": ["a", "b"]}
+    assert crawler.diff_channels(channels, {"CCTV1": ["a", "b"]}) == ([], {})
+
+
+def test_publish_delta_sequence(crawler):
+    assert crawler.publish_delta({"CCTV1": ["a", "b"]}) is True
+    assert crawler.publish_delta({"CCTV1": ["a", "b"]}) is False
+    assert crawler.publish_delta({"CCTV1": ["b", "a"], "CCTV2": ["c"]}) is True
+
+    feed = read_json(crawler, "FEED_FILE")
+    assert feed["latest_seq"] == 2
+    assert [(e["seq"], e["base_seq"]) for e in feed["entries"]] == [(1, 0), (2, 1)]
+    assert read_json(crawler, "SNAPSHOT_FILE")["seq"] == 2
+
+
+def test_publish_delta_failed_snapshot_does_not_repeat_seq(crawler, monkeypatch):
+    crawler.publish_delta({"CCTV1": ["a"]})
+
+    write_text_atomic = crawler.write_text_atomic
+    def fail_on_snapshot(path, text):
+        if path.name == crawler.CONFIG["SNAPSHOT_FILE"]:
+            raise OSError("disk full")
+        write_text_atomic(path, text)
+    monkeypatch.setattr(crawler, "write_text_atomic", fail_on_snapshot)
+    assert crawler.publish_delta({"CCTV1": ["b"]}) is False
+    monkeypatch.setattr(crawler, "write_text_atomic", write_text_atomic)
+
+    # 变更流已领先快照：先补齐 #2，再基于 #2 发布 #3
+    assert crawler.publish_delta({"CCTV1": ["b", "c"]}) is True
+    entries = read_json(crawler, "FEED_FILE")["entries"]
+    assert [(e["seq"], e["base_seq"]) for e in entries] == [(1, 0), (2, 1), (3, 2)]
+    assert entries[-1]["changes"] == {"added": [["CCTV1", "c", 2]]}
+    assert read_json(crawler, "SNAPSHOT_FILE") | {"generated_at": None} == {
+        "seq": 3, "generated_at": None, "channels": {"CCTV1": ["b", "c"]}}
+    assert not list(Path().glob("*.tmp"))
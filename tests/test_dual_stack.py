@@ -0,0 +1,96 @@
+"""双栈测速本地验证：在 127.0.0.1 与 ::1 上监听，检查分地址族耗时与更快地址族的选择"""
+import importlib.util
+import json
+import socket
+from pathlib import Path
+
+import pytest
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "备用.py"
+
+
+def ipv6_loopback_available():
+    if not socket.has_ipv6:
+        return False
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as sock:
+            sock.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not ipv6_loopback_available(), reason="本机不支持 IPv6 回环地址")
+
+
+@pytest.fixture
+def crawler(monkeypatch, tmp_path):
+    """每个用例加载一份独立的脚本模块（全局缓存互不影响），输出文件写入临时目录"""
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("backup_crawler", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.install_dns_cache()
+    yield module
+    socket.getaddrinfo = module.SYSTEM_GETADDRINFO
+
+
+def listen(family, host, port=0):
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.bind((host, port))
+    sock.listen(16)
+    return sock
+
+
+def free_port_pair():
+    """同一端口号同时在 127.0.0.1 与 ::1 上监听"""
+    for _ in range(20):
+        v4 = listen(socket.AF_INET, "127.0.0.1")
+        port = v4.getsockname()[1]
+        try:
+            return v4, listen(socket.AF_INET6, "::1", port), port
+        except OSError:
+            v4.close()
+    pytest.skip("找不到可同时在 IPv4/IPv6 回环监听的端口")
+
+
+def test_dual_stack_host_measures_both_families(crawler):
+    v4, v6, port = free_port_pair()
+    try:
+        crawler.dns_cache_put("dual.test", [(socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1")], 300, 0)
+        channels = {"CCTV1": [f"http://dual.test:{port}/live.m3u8"]}
+        crawler.screen_channels_by_tcp(channels)
+
+        assert channels["CCTV1"] == [f"http://dual.test:{port}/live.m3u8"]
+        measured = crawler.ENDPOINT_FAMILY_LATENCY[("dual.test", port)]
+        assert measured["ipv4"] is not None and measured["ipv6"] is not None
+        info = crawler.url_family_info(channels["CCTV1"][0])
+        assert info["family"] == measured["preferred"] in ("ipv4", "ipv6")
+        # 更快的地址族已排到DNS缓存最前
+        assert crawler.DNS_CACHE["dual.test"]["addrs"][0][1] == ("::1" if info["family"] == "ipv6" else "127.0.0.1")
+    finally:
+        v4.close()
+        v6.close()
+
+
+def test_family_with_refused_connection_is_not_preferred(crawler):
+    v6 = listen(socket.AF_INET6, "::1")
+    port = v6.getsockname()[1]
+    try:
+        crawler.dns_cache_put("v6only.test", [(socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1")], 300, 0)
+        url = f"http://v6only.test:{port}/live.m3u8"
+        crawler.screen_channels_by_tcp({"CCTV1": [url]})
+
+        measured = crawler.ENDPOINT_FAMILY_LATENCY[("v6only.test", port)]
+        assert measured["ipv4"] is None
+        assert measured["preferred"] == "ipv6"
+        assert crawler.DNS_CACHE["v6only.test"]["addrs"][0] == (socket.AF_INET6, "::1")
+
+        crawler.RUN_PROBE_LOG[url] = 0.01
+        crawler.generate_playlist_json({"CCTV1": [url]})
+        entry = json.loads(Path(crawler.CONFIG["OUTPUT_JSON_FILE"]).read_text(encoding="utf-8"))["channels"]["CCTV1"][0]
+        assert entry["family"] == "ipv6"
+        assert entry["ipv4"] is False and entry["ipv6"] is True
+        assert "latency" not in entry
+    finally:
+        v6.close()
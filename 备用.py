@@ -1,11 +1,20 @@
+import os
 import re
+import json
+import errno
+import hashlib
+import socket
+import selectors
+import ipaddress
+import threading
 import requests
 import time
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
+from urllib.parse import urlparse, urljoin
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 
 # ---------- 进度条（可选依赖）----------
 try:
@@ -18,6 +27,13 @@ except ImportError:
         return iterable
     print("提示：未安装 tqdm，使用简单进度显示。运行 'pip install tqdm' 获得更好体验")
 
+# ---------- DNS解析（dnspython 已列入 requirements.txt，用于读取记录真实TTL；缺失时回落系统解析器+DEFAULT_TTL）----------
+try:
+    import dns.resolver
+    import dns.exception
+except ImportError:
+    dns = None
+
 # ===============================
 # 全局配置区（核心参数可调）
 # ===============================
@@ -25,6 +41,16 @@ CONFIG = {
     "SOURCE_TXT_FILE": "iptv_sources.txt",          # 存储所有IPTV源链接（远程源）
     "M3U8_SOURCES_FILE": "m3u8_sources.txt",        # 新增：存储独立m3u8链接的文件
     "OUTPUT_FILE": "iptv_playlist.m3u8",            # 生成的最优播放列表
+    "OUTPUT_JSON_FILE": "iptv_playlist.json",       # 前K结果明细（排名、各地址族是否可连接、更快的地址族）
+    "SNAPSHOT_FILE": "iptv_snapshot.json",          # 上次发布的排序结果快照（带序号）
+    "FEED_FILE": "iptv_feed.json",                  # 增量变更流（JSON Patch，按序号递增）
+    "FEED_MAX_ENTRIES": 100,                        # 变更流保留的最近条目数
+    # 按地址族单独排序的播放列表（供仅IPv4/仅IPv6客户端使用），默认关闭
+    "FAMILY_PLAYLISTS": {
+        "enabled": False,
+        "ipv4": "iptv_playlist_ipv4.m3u8",
+        "ipv6": "iptv_playlist_ipv6.m3u8"
+    },
     "HEADERS": {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "Connection": "close"                        # 关闭长连接，减少资源占用
@@ -42,6 +68,59 @@ CONFIG = {
         "enabled": True,                               # 是否启用单独配置
         "TEST_TIMEOUT": 5,                             # CCTV 频道超时时间（秒）
         "MAX_WORKERS": 20                              # CCTV 频道并发线程数
+    },
+    # 黑名单引擎（静态规则编译为快速匹配器 + 基于测速历史自动学习）
+    "BLACKLIST": {
+        "SCHEMES": ["p2p", "p3p", "rtmp", "rtsp", "udp", "rtp", "mitv"],  # 不支持的协议
+        "DOMAINS": ["vip.lzcdn2.com", "vip1.lz-cdn1.com"],  # 后缀匹配，自动覆盖所有子域名
+        "CIDRS": [],                                   # 拉黑IP段，如 "10.0.0.0/8"、"fd00::/8"
+        "STATE_FILE": "blacklist_state.json",          # 自学习黑名单的跨运行持久化文件
+        "HOST_FAIL_RUNS": 3,                           # 主机(含端口)连续N次运行全部失败则自动拉黑
+        "PATH_FAIL_RUNS": 3,                           # 路径模式连续N次运行全部失败则自动拉黑
+        "PATH_MIN_HOSTS": 3,                           # 路径模式需在至少N个不同主机上失败才学习
+        "EXPIRE_HOURS": 72                             # 自动拉黑有效期，过期后重新测速以便恢复
+    },
+    # DNS 共享缓存与批量预解析（测速前统一解析所有主机名）
+    "DNS_CACHE": {
+        "enabled": True,
+        "MAX_WORKERS": 64,                             # 预解析并发数
+        "TIMEOUT": 3,                                  # 单次查询超时（秒），每个主机查询 A 与 AAAA 两次，超时的主机不缓存
+        "DEFAULT_TTL": 300,                            # 仅在未安装 dnspython（无法获取记录TTL）时使用的缓存时长（秒）
+        "MIN_TTL": 30,                                 # TTL下限，避免极短TTL导致反复解析
+        "NEGATIVE_TTL": 600                            # NXDOMAIN 负缓存时长（秒）
+    },
+    # 源列表产出评分（按每个源贡献进入前K的链接数自适应分配测速预算）
+    "SOURCE_YIELD": {
+        "enabled": True,
+        "STATE_FILE": "source_yield.json",             # 各源历史产出的跨运行持久化文件
+        "EWMA_ALPHA": 0.5,                             # 产出率指数滑动平均系数（越大越看重最近一次）
+        "LOW_YIELD_SCORE": 0.02,                       # 产出率低于该值视为低产源
+        "SAMPLE_RATIO": 0.3,                           # 低产源独有链接的抽样测速比例（按链接哈希固定抽样），其余仅在前K不足时补测
+        "SKIP_AFTER_RUNS": 3,                          # 连续N次有测速的运行中均无记入本源的前K链接则自动跳过
+        "RECHECK_EVERY_RUNS": 5                        # 被跳过的源每隔N次运行重新爬取一次
+    },
+    # 镜像流内容指纹去重（同一上游的不同域名/代理只测一个代表，前K按不同源站选取）
+    "FINGERPRINT": {
+        "enabled": True,
+        "STATE_FILE": "stream_fingerprints.json",      # 链接→源站分组的跨运行持久化文件
+        "MAX_BYTES": 65536,                            # 读取播放列表正文的最大字节数
+        "MIN_SHARED_SEGMENTS": 2,                      # 至少共享N个“序号+分片名”才判定为同源
+        "EXPIRE_HOURS": 24                             # 分组有效期，过期后重新采集指纹
+    },
+    # 分层测速：TCP连接初筛 → HTTP测速（使用上方 TEST_TIMEOUT/MAX_WORKERS 及CCTV配置）→ 前K候选HLS深度检查
+    "PROBE_TIERS": {
+        "TCP": {
+            "enabled": True,
+            "TIMEOUT": 1.0,                            # 连接超时（秒），只判断端口是否可连
+            "MAX_CONCURRENCY": 500,                    # 同时进行的非阻塞连接数
+            "DUAL_STACK": True                         # 同时测量IPv4与IPv6地址，记录各自连接耗时
+        },
+        "HLS": {
+            "enabled": False,                          # 深度检查会额外下载播放列表和首个分片，默认关闭
+            "TIMEOUT": 5,
+            "MAX_WORKERS": 20,
+            "CANDIDATES_FACTOR": 2                     # 对前 TOP_K*N 个候选做深度检查
+        }
     }
 }
 
@@ -219,6 +298,38 @@ CCTV_PATTERN = re.compile(
 # 2. 缓存别名映射（仅构建一次）
 GLOBAL_ALIAS_MAP = None
 
+# 2.1 缓存编译后的黑名单匹配器（仅构建一次）
+GLOBAL_BLACKLIST = None
+# 路径模式归一化：数字串统一替换，使 /live/1001.m3u8 与 /live/1002.m3u8 归为同一模式
+PATH_DIGITS_PATTERN = re.compile(r"\d+")
+# 本轮测速结果 {url: 延迟}（失败为 inf），用于更新自学习黑名单
+RUN_PROBE_LOG = {}
+# 本轮每个链接的实际测速耗时 {url: 秒}，用于计算源的测速成本
+RUN_PROBE_COST = {}
+
+# 2.2 DNS 共享缓存 {主机名: {"addrs": [(地址族, IP)], "expires": 过期时间戳, "cost": 解析耗时}}
+# addrs 为空列表表示负缓存（NXDOMAIN）
+DNS_CACHE = {}
+DNS_CACHE_LOCK = threading.Lock()
+SYSTEM_GETADDRINFO = socket.getaddrinfo
+
+# 2.3 本轮运行指标（结束时统一输出）
+RUN_METRICS = {}
+RUN_METRICS_LOCK = threading.Lock()
+
+# 2.4 链接来源 {url: {源标识}}（独立m3u8文件以文件名为标识）与源产出评分状态（仅加载一次）
+URL_PROVENANCE = {}
+SOURCE_YIELD_STATE = None
+
+# 2.5 分地址族连接耗时 {(主机名, 端口): {"ipv4": 秒或None, "ipv6": 秒或None, "preferred": 初筛选定的更快地址族}}
+#     （无该族地址则不含该键）
+ENDPOINT_FAMILY_LATENCY = {}
+# 各频道通过HTTP测速的全部候选 {频道名: {url: 延迟}}，用于按地址族单独排序
+CHANNEL_CANDIDATES = {}
+
+# 2.6 镜像流指纹状态 {url: {"origin": 源站分组, "digest": 正文摘要, "latency": 最近延迟, "ts": 采集时间}}（仅加载一次）
+FINGERPRINT_STATE = None
+
 # 3. 缓存所有分类频道的集合（快速判断频道是否已分类）
 ALL_CATEGORIZED_CHANNELS = set()
 for category_ch_list in CHANNEL_CATEGORIES.values():
@@ -310,6 +421,564 @@ def build_alias_map():
     GLOBAL_ALIAS_MAP = alias_map
     return GLOBAL_ALIAS_MAP
 
+# ===============================
+# 黑名单引擎（协议集合 + 域名后缀树 + CIDR网段 + 自学习主机/路径）
+# ===============================
+def url_endpoint(url):
+    """提取 (主机名, 端口)，主机名统一小写；解析失败返回 (None, None)"""
+    try:
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").rstrip(".") or None  # 兼容 FQDN 末尾的点
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        return None, None
+    return host, port
+
+def url_path_template(url):
+    """路径模式：去掉主机和查询参数，数字串归一化（如 /PLTV/88888888/224/3221225618/index.m3u8 → /pltv/0/0/0/index.m3u8）"""
+    try:
+        path = urlparse(url).path.lower()
+    except ValueError:
+        return ""
+    return PATH_DIGITS_PATTERN.sub("0", path)
+
+def load_blacklist_state():
+    """读取自学习黑名单状态，文件不存在或损坏时返回空状态"""
+    state_path = Path(CONFIG["BLACKLIST"]["STATE_FILE"])
+    state = {"hosts": {}, "paths": {}}
+    if not state_path.exists():
+        return state
+    try:
+        data = json.loads(state_path.read_text(encoding="utf-8"))
+        state["hosts"] = data.get("hosts", {})
+        state["paths"] = data.get("paths", {})
+    except Exception as e:
+        print(f"⚠️  黑名单状态文件损坏，已忽略：{e}")
+    return state
+
+def save_blacklist_state(state):
+    state_path = Path(CONFIG["BLACKLIST"]["STATE_FILE"])
+    try:
+        state_path.write_text(json.dumps(state, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    except Exception as e:
+        print(f"❌ 保存黑名单状态失败：{e}")
+
+def expire_blacklist_entries(entries, fail_runs, compiled_at):
+    """
+    本轮编译黑名单时已过期的条目（即本轮参与了测速）解除拉黑并进入观察期：
+    计数置为阈值-1，再失败一次即重新拉黑
+    """
+    for entry in entries.values():
+        blocked_until = entry.get("blocked_until")
+        if blocked_until is not None and blocked_until <= compiled_at:
+            del entry["blocked_until"]
+            entry["fail_runs"] = fail_runs - 1
+
+def prune_blacklist_entries(entries, run_stamp):
+    """
+    清理本轮未失败的未拉黑条目：连续失败被中断（本轮成功、未出现或未达到学习条件）即重新计数，
+    状态文件只保留仍在拉黑中或本轮刚失败的条目，不会无限增长
+    """
+    for key in [key for key, entry in entries.items()
+                if "blocked_until" not in entry and entry.get("last_fail") != run_stamp]:
+        del entries[key]
+
+def build_blacklist():
+    """编译黑名单匹配器（结果全局缓存）：静态规则 + 未过期的自学习条目"""
+    global GLOBAL_BLACKLIST
+    if GLOBAL_BLACKLIST is not None:
+        return GLOBAL_BLACKLIST
+
+    bl_config = CONFIG["BLACKLIST"]
+    # 域名后缀树：按标签逆序建树，如 vip.lzcdn2.com → com → lzcdn2 → vip
+    domain_trie = {}
+    for domain in bl_config["DOMAINS"]:
+        node = domain_trie
+        for label in reversed(domain.lower().strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node[""] = True  # 终止标记
+
+    networks = []
+    for cidr in bl_config["CIDRS"]:
+        try:
+            networks.append(ipaddress.ip_network(cidr, strict=False))
+        except ValueError:
+            print(f"⚠️  无效的CIDR规则，已跳过：{cidr}")
+
+    now = time.time()
+    state = load_blacklist_state()
+    learned_endpoints = {ep for ep, entry in state["hosts"].items() if entry.get("blocked_until", 0) > now}
+    learned_paths = {tpl for tpl, entry in state["paths"].items() if entry.get("blocked_until", 0) > now}
+    if learned_endpoints or learned_paths:
+        print(f"ℹ️  已加载自学习黑名单：{len(learned_endpoints)} 个主机，{len(learned_paths)} 个路径模式")
+
+    GLOBAL_BLACKLIST = {
+        "schemes": frozenset(s.lower() for s in bl_config["SCHEMES"]),
+        "domain_trie": domain_trie,
+        "networks": networks,
+        "endpoints": frozenset(learned_endpoints),
+        "paths": frozenset(learned_paths),
+        "compiled_at": now,
+        "blocked_count": 0
+    }
+    return GLOBAL_BLACKLIST
+
+def is_valid_url(url):
+    """
+    黑名单校验（解析阶段调用，命中黑名单的链接不会进入测速队列）
+    返回 True 表示可用，False 表示被拉黑
+    """
+    blacklist = build_blacklist()
+    if blacklist_match(url, blacklist):
+        blacklist["blocked_count"] += 1
+        return False
+    return True
+
+def blacklist_match(url, blacklist):
+    # 1. 协议：兼容 rtmp://xxx 与 p2p/xxx 两种写法
+    scheme = url.split("://", 1)[0] if "://" in url else url.split("/", 1)[0]
+    if scheme.lower() in blacklist["schemes"]:
+        return True
+
+    host, port = url_endpoint(url)
+    if not host:
+        return True
+    # 2. 自学习主机（精确到端口）
+    if f"{host}:{port}" in blacklist["endpoints"]:
+        return True
+
+    # 3. IP段 / 域名后缀
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        ip = None
+    if ip is not None:
+        if any(ip in net for net in blacklist["networks"] if net.version == ip.version):
+            return True
+    else:
+        node = blacklist["domain_trie"]
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            if "" in node:
+                return True
+
+    # 4. 自学习路径模式
+    return bool(blacklist["paths"]) and url_path_template(url) in blacklist["paths"]
+
+def update_blacklist_state(probe_log):
+    """
+    根据本轮测速结果更新自学习黑名单并持久化
+    - 主机(含端口)下所有链接均失败：失败计数+1，连续达到阈值后拉黑 EXPIRE_HOURS 小时
+    - 路径模式在多个主机上均失败：同理
+    - 本轮成功或未出现即中断连续失败，清除记录
+    """
+    if not probe_log:
+        return
+    if not any(latency < float('inf') for latency in probe_log.values()):
+        # 全部失败更可能是本机网络故障，不据此学习
+        print("⚠️  本轮测速全部失败，跳过黑名单学习")
+        return
+
+    bl_config = CONFIG["BLACKLIST"]
+    host_fail_runs = bl_config["HOST_FAIL_RUNS"]
+    path_fail_runs = bl_config["PATH_FAIL_RUNS"]
+    expire_seconds = bl_config["EXPIRE_HOURS"] * 3600
+    run_stamp = round(time.time(), 3)  # 本轮标识，用于判断条目本轮是否失败
+    compiled_at = build_blacklist()["compiled_at"]
+
+    endpoint_ok = {}
+    path_ok = {}
+    path_failed_hosts = {}
+    for url, latency in probe_log.items():
+        host, port = url_endpoint(url)
+        if not host:
+            continue
+        ok = latency < float('inf')
+        endpoint = f"{host}:{port}"
+        endpoint_ok[endpoint] = endpoint_ok.get(endpoint, False) or ok
+        template = url_path_template(url)
+        path_ok[template] = path_ok.get(template, False) or ok
+        if not ok:
+            path_failed_hosts.setdefault(template, set()).add(host)
+
+    state = load_blacklist_state()
+    expire_blacklist_entries(state["hosts"], host_fail_runs, compiled_at)
+    expire_blacklist_entries(state["paths"], path_fail_runs, compiled_at)
+
+    def record(entries, key, ok, threshold):
+        if ok:
+            entries.pop(key, None)
+            return 0
+        entry = entries.setdefault(key, {"fail_runs": 0})
+        entry["fail_runs"] += 1
+        entry["last_fail"] = run_stamp
+        if entry["fail_runs"] >= threshold and "blocked_until" not in entry:
+            entry["blocked_until"] = run_stamp + expire_seconds
+            return 1
+        return 0
+
+    new_hosts = sum(record(state["hosts"], ep, ok, host_fail_runs) for ep, ok in endpoint_ok.items())
+    new_paths = 0
+    for template, ok in path_ok.items():
+        if not ok and len(path_failed_hosts.get(template, ())) < bl_config["PATH_MIN_HOSTS"]:
+            continue
+        new_paths += record(state["paths"], template, ok, path_fail_runs)
+
+    prune_blacklist_entries(state["hosts"], run_stamp)
+    prune_blacklist_entries(state["paths"], run_stamp)
+    save_blacklist_state(state)
+    print(f"🧹 黑名单学习完成：新增拉黑 {new_hosts} 个主机、{new_paths} 个路径模式（有效期 {bl_config['EXPIRE_HOURS']} 小时）")
+
+# ===============================
+# DNS 共享缓存（批量预解析 + TTL + 负缓存）
+# ===============================
+def add_metric(name, value):
+    """累加运行指标（线程安全）"""
+    with RUN_METRICS_LOCK:
+        RUN_METRICS[name] = RUN_METRICS.get(name, 0) + value
+
+def is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+def resolve_host(host, timeout):
+    """
+    解析单个主机名（同时获取 A 与 AAAA 记录）
+    返回 (状态, [(地址族, IP)], TTL)，状态为 "ok" / "negative"（NXDOMAIN）/ "error"（超时等临时错误，不缓存）
+    """
+    dns_config = CONFIG["DNS_CACHE"]
+    if dns is not None:
+        addrs, ttls, errors = [], [], 0
+        for rdtype, family in (("A", socket.AF_INET), ("AAAA", socket.AF_INET6)):
+            try:
+                answer = dns.resolver.resolve(host, rdtype, lifetime=timeout)
+            except dns.resolver.NXDOMAIN:
+                break
+            except dns.resolver.NoAnswer:
+                continue
+            except dns.exception.DNSException:
+                errors += 1
+                continue
+            ttls.append(answer.rrset.ttl)
+            addrs.extend((family, record.address) for record in answer)
+        if addrs:
+            return ("ok", addrs, max(min(ttls), dns_config["MIN_TTL"]))
+        if errors:
+            return ("error", [], 0)
+        # dnspython 不读取 hosts 文件，负结果交给系统解析器确认（如 localhost、内网主机名）
+
+    # 系统解析器：无法获取TTL，使用默认缓存时长
+    try:
+        infos = SYSTEM_GETADDRINFO(host, None, 0, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)):
+            return ("negative", [], dns_config["NEGATIVE_TTL"])
+        return ("error", [], 0)
+    except OSError:
+        return ("error", [], 0)
+    addrs = []
+    for family, _, _, _, sockaddr in infos:
+        if (family, sockaddr[0]) not in addrs:
+            addrs.append((family, sockaddr[0]))
+    return ("ok", addrs, dns_config["DEFAULT_TTL"])
+
+def dns_cache_get(host):
+    """读取未过期的缓存条目，过期或不存在返回 None"""
+    with DNS_CACHE_LOCK:
+        entry = DNS_CACHE.get(host)
+        if entry is None:
+            return None
+        if entry["expires"] <= time.time():
+            del DNS_CACHE[host]
+            return None
+        return entry
+
+def dns_cache_put(host, addrs, ttl, cost):
+    with DNS_CACHE_LOCK:
+        DNS_CACHE[host] = {"addrs": addrs, "expires": time.time() + ttl, "cost": cost}
+
+def is_unresolvable_host(host):
+    """主机是否命中负缓存（NXDOMAIN）"""
+    entry = dns_cache_get(host)
+    return entry is not None and not entry["addrs"]
+
+def cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    """
+    替换 socket.getaddrinfo：命中缓存直接返回，NXDOMAIN 立即失败，未命中时回落系统解析并写入缓存
+    requests/urllib3 建立连接时会经过这里，因此测速线程共享同一份解析结果
+    """
+    if not isinstance(host, str) or is_ip_literal(host) or type not in (0, socket.SOCK_STREAM) \
+            or not (port is None or isinstance(port, int) or str(port).isdigit()):
+        return SYSTEM_GETADDRINFO(host, port, family, type, proto, flags)
+
+    entry = dns_cache_get(host)
+    if entry is None:
+        start_time = time.time()
+        try:
+            infos = SYSTEM_GETADDRINFO(host, port, family, type, proto, flags)
+        except socket.gaierror as e:
+            if e.errno == socket.EAI_NONAME:
+                dns_cache_put(host, [], CONFIG["DNS_CACHE"]["NEGATIVE_TTL"], time.time() - start_time)
+            raise
+        add_metric("dns_misses", 1)
+        if family == 0:
+            addrs = []
+            for info_family, _, _, _, sockaddr in infos:
+                if (info_family, sockaddr[0]) not in addrs:
+                    addrs.append((info_family, sockaddr[0]))
+            dns_cache_put(host, addrs, CONFIG["DNS_CACHE"]["DEFAULT_TTL"], time.time() - start_time)
+        return infos
+
+    add_metric("dns_hits", 1)
+    add_metric("dns_saved_seconds", entry["cost"])
+    if not entry["addrs"]:
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known (cached)")
+    port_num = int(port) if port is not None else 0
+    results = []
+    for addr_family, ip in entry["addrs"]:
+        if family not in (0, addr_family):
+            continue
+        sockaddr = (ip, port_num, 0, 0) if addr_family == socket.AF_INET6 else (ip, port_num)
+        results.append((addr_family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", sockaddr))
+    if not results:
+        raise socket.gaierror(socket.EAI_ADDRFAMILY if hasattr(socket, "EAI_ADDRFAMILY") else socket.EAI_NONAME,
+                              "No address associated with hostname (cached)")
+    return results
+
+def install_dns_cache():
+    """启用进程内共享DNS缓存"""
+    if CONFIG["DNS_CACHE"]["enabled"]:
+        socket.getaddrinfo = cached_getaddrinfo
+
+def prefetch_dns(urls):
+    """
+    批量并发预解析所有链接的主机名并写入缓存
+    返回负缓存（NXDOMAIN）主机集合
+    """
+    dns_config = CONFIG["DNS_CACHE"]
+    hosts = set()
+    for url in urls:
+        host, _ = url_endpoint(url)
+        if host and not is_ip_literal(host) and dns_cache_get(host) is None:
+            hosts.add(host)
+    if not hosts:
+        return set()
+
+    print(f"🌐 开始批量预解析DNS：共 {len(hosts)} 个主机名（并发数：{dns_config['MAX_WORKERS']}）")
+    negative_hosts = set()
+    resolved_count = 0
+    serial_cost = 0.0
+    start_time = time.time()
+
+    def timed_resolve(host):
+        begin = time.time()
+        status, addrs, ttl = resolve_host(host, dns_config["TIMEOUT"])
+        return host, status, addrs, ttl, time.time() - begin
+
+    # 每个主机最多耗时 2×TIMEOUT（A + AAAA），主机数超过并发数时按排队轮数放宽整体等待时间
+    rounds = -(-len(hosts) // dns_config["MAX_WORKERS"])
+    deadline = rounds * 2 * dns_config["TIMEOUT"] + 1
+    executor = ThreadPoolExecutor(max_workers=dns_config["MAX_WORKERS"])
+    futures = [executor.submit(timed_resolve, host) for host in hosts]
+    done, not_done = wait(futures, timeout=deadline)
+    # 系统解析器无法中断，超时的主机直接放弃等待（不缓存，测速时再按需解析）
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        host, status, addrs, ttl, cost = future.result()
+        serial_cost += cost
+        if status == "ok":
+            dns_cache_put(host, addrs, ttl, cost)
+            resolved_count += 1
+        elif status == "negative":
+            dns_cache_put(host, [], ttl, cost)
+            negative_hosts.add(host)
+
+    elapsed = time.time() - start_time
+    add_metric("dns_prefetch_hosts", len(hosts))
+    add_metric("dns_prefetch_seconds", elapsed)
+    add_metric("dns_prefetch_serial_seconds", serial_cost)
+    add_metric("dns_negative_hosts", len(negative_hosts))
+    print(f"✅ DNS预解析完成：成功 {resolved_count} 个，NXDOMAIN {len(negative_hosts)} 个，超时/错误 {len(hosts) - resolved_count - len(negative_hosts)} 个，耗时 {elapsed:.2f}s\n")
+    return negative_hosts
+
+def drop_unresolvable_urls(channels):
+    """剔除主机名命中负缓存的链接（原地修改），返回剔除数量"""
+    dropped = 0
+    for std_ch, urls in channels.items():
+        kept = [url for url in urls if not is_unresolvable_host(url_endpoint(url)[0] or "")]
+        dropped += len(urls) - len(kept)
+        channels[std_ch] = kept
+    if dropped:
+        add_metric("dns_negative_dropped_urls", dropped)
+        print(f"🚫 DNS负缓存剔除 {dropped} 个无法解析的链接（不进入测速队列）")
+    return dropped
+
+def print_run_metrics():
+    """输出本轮运行指标"""
+    if not RUN_METRICS:
+        return
+    print("\n📊 运行指标：")
+    if "dns_prefetch_hosts" in RUN_METRICS or "dns_hits" in RUN_METRICS:
+        print(f"   DNS：预解析 {RUN_METRICS.get('dns_prefetch_hosts', 0)} 个主机，"
+              f"批量耗时 {RUN_METRICS.get('dns_prefetch_seconds', 0):.2f}s（串行需 {RUN_METRICS.get('dns_prefetch_serial_seconds', 0):.2f}s），"
+              f"缓存命中 {RUN_METRICS.get('dns_hits', 0)} 次 / 未命中 {RUN_METRICS.get('dns_misses', 0)} 次，"
+              f"节省解析时间 {RUN_METRICS.get('dns_saved_seconds', 0):.2f}s，"
+              f"负缓存剔除 {RUN_METRICS.get('dns_negative_dropped_urls', 0)} 个链接")
+    if "fingerprint_fetches" in RUN_METRICS or "fingerprint_skipped_probes" in RUN_METRICS:
+        print(f"   镜像去重：采集指纹 {RUN_METRICS.get('fingerprint_fetches', 0)} 次，同源镜像免测 {RUN_METRICS.get('fingerprint_skipped_probes', 0)} 个链接")
+    if "tcp_endpoints" in RUN_METRICS:
+        print(f"   分层测速：TCP初筛 {RUN_METRICS['tcp_endpoints']} 个主机端口（可连接 {RUN_METRICS.get('tcp_alive_endpoints', 0)} 个，"
+              f"耗时 {RUN_METRICS.get('tcp_seconds', 0):.2f}s），剔除 {RUN_METRICS.get('tcp_dropped_urls', 0)} 个链接，"
+              f"HTTP测速 {len(RUN_PROBE_COST)} 个链接，HLS深度检查 {RUN_METRICS.get('hls_checked', 0)} 个（失败 {RUN_METRICS.get('hls_failed', 0)} 个）")
+        print(f"   双栈：IPv4更快 {RUN_METRICS.get('dual_stack_ipv4_faster', 0)} 个主机端口，IPv6更快 {RUN_METRICS.get('dual_stack_ipv6_faster', 0)} 个")
+    if "yield_deferred_urls" in RUN_METRICS:
+        print(f"   源产出：低产源延后 {RUN_METRICS['yield_deferred_urls']} 个链接，其中因前K不足补测 {RUN_METRICS.get('yield_deferred_probed_urls', 0)} 个")
+
+# ===============================
+# 源列表产出评分（自适应测速预算）
+# ===============================
+def get_source_yield_state():
+    """读取源产出评分状态（结果全局缓存），文件不存在或损坏时返回空状态"""
+    global SOURCE_YIELD_STATE
+    if SOURCE_YIELD_STATE is not None:
+        return SOURCE_YIELD_STATE
+
+    state_path = Path(CONFIG["SOURCE_YIELD"]["STATE_FILE"])
+    SOURCE_YIELD_STATE = {}
+    if state_path.exists():
+        try:
+            SOURCE_YIELD_STATE = json.loads(state_path.read_text(encoding="utf-8")).get("sources", {})
+        except Exception as e:
+            print(f"⚠️  源产出状态文件损坏，已忽略：{e}")
+    return SOURCE_YIELD_STATE
+
+def save_source_yield_state(state):
+    state_path = Path(CONFIG["SOURCE_YIELD"]["STATE_FILE"])
+    try:
+        state_path.write_text(json.dumps({"sources": state}, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    except Exception as e:
+        print(f"❌ 保存源产出状态失败：{e}")
+
+def should_skip_source(source_url):
+    """
+    连续多次运行没有任何前K链接记入本源（见 update_source_yield）的源自动跳过，
+    每隔 RECHECK_EVERY_RUNS 次运行重新爬取一次，以便源恢复后重新启用
+    """
+    yield_config = CONFIG["SOURCE_YIELD"]
+    if not yield_config["enabled"]:
+        return False
+    entry = get_source_yield_state().get(source_url)
+    if not entry or entry.get("zero_new_runs", 0) < yield_config["SKIP_AFTER_RUNS"]:
+        return False
+    if entry.get("skipped_runs", 0) + 1 >= yield_config["RECHECK_EVERY_RUNS"]:
+        entry["skipped_runs"] = 0
+        print(f"🔁 低产源到达复查周期，本轮重新爬取：{source_url}")
+        return False
+    entry["skipped_runs"] = entry.get("skipped_runs", 0) + 1
+    return True
+
+def record_provenance(source_id, channels):
+    """记录链接来源（同一链接可能来自多个源）"""
+    for urls in channels.values():
+        for url in urls:
+            URL_PROVENANCE.setdefault(url, set()).add(source_id)
+
+def url_in_sample(url, ratio):
+    """按链接哈希做确定性抽样，同一链接每次运行结果一致，避免排序结果随机抖动"""
+    bucket = int(hashlib.sha1(url.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < ratio
+
+def plan_probe_urls(urls):
+    """
+    按来源产出率安排测速预算，返回 (首批测速链接, 延后链接)：
+    高产源链接与低产源的抽样链接首批测速，其余仅来自低产源的链接延后，仅在首批不足前K时补测
+    无历史记录的源视为高产
+    """
+    yield_config = CONFIG["SOURCE_YIELD"]
+    if not yield_config["enabled"]:
+        return urls, []
+    state = get_source_yield_state()
+
+    def best_score(url):
+        scores = [state.get(src, {}).get("score", float('inf')) for src in URL_PROVENANCE.get(url, ())]
+        return max(scores, default=float('inf'))
+
+    scored = sorted(((best_score(url), url) for url in urls), key=lambda x: -x[0])
+    planned, low_yield = [], []
+    for score, url in scored:
+        (low_yield if score < yield_config["LOW_YIELD_SCORE"] else planned).append(url)
+    sampled = [url for url in low_yield if url_in_sample(url, yield_config["SAMPLE_RATIO"])]
+    deferred = [url for url in low_yield if url not in sampled]
+    return planned + sampled, deferred
+
+def update_source_yield(top_channels):
+    """
+    统计本轮每个源的产出并更新评分：
+    贡献链接数 / 去重后独有链接数 / 进入前K的链接数 / 记入本源的前K链接数 / 测速次数与耗时
+    - 产出率只按实际测速（含TCP初筛）的链接计算，未抽中或延后未测的链接不计入分母；共享链接的测速耗时按来源数均摊
+    - 多个源共有的前K链接只记入其中评分最高的一个源，保证跳过其余源不会丢失该链接
+    - 只有本轮确有链接参与测速时才累计“连续无新增”次数，全部延后未测的源不会因此被跳过
+    """
+    if not CONFIG["SOURCE_YIELD"]["enabled"]:
+        return
+    yield_config = CONFIG["SOURCE_YIELD"]
+    alpha = yield_config["EWMA_ALPHA"]
+    top_urls = {url for urls in top_channels.values() for url in urls}
+    state = get_source_yield_state()
+
+    def credit_rank(src):
+        return (state.get(src, {}).get("score", float('inf')), src)
+
+    stats = {}
+    for url, sources in URL_PROVENANCE.items():
+        share = 1 / len(sources)
+        is_unique = len(sources) == 1
+        in_top = url in top_urls
+        credited_src = max(sources, key=credit_rank) if in_top else None
+        for src in sources:
+            st = stats.setdefault(src, {"contributed": 0, "unique": 0, "topk": 0, "credited_topk": 0,
+                                        "probed": 0, "probe_seconds": 0.0})
+            st["contributed"] += 1
+            st["unique"] += is_unique
+            st["topk"] += in_top
+            st["credited_topk"] += src == credited_src
+            if url in RUN_PROBE_LOG:
+                st["probed"] += 1
+                st["probe_seconds"] += RUN_PROBE_COST.get(url, 0.0) * share
+
+    for src, st in stats.items():
+        entry = state.setdefault(src, {"runs": 0, "zero_new_runs": 0, "skipped_runs": 0})
+        if st["probed"]:
+            run_yield = st["topk"] / st["probed"]
+            entry["score"] = round(run_yield if "score" not in entry else alpha * run_yield + (1 - alpha) * entry["score"], 4)
+            entry["zero_new_runs"] = 0 if st["credited_topk"] else entry["zero_new_runs"] + 1
+        entry["runs"] += 1
+        st["probe_seconds"] = round(st["probe_seconds"], 2)
+        entry["last"] = st
+    # 即使本轮所有源都被跳过也要保存，否则 should_skip_source 累计的跳过次数丢失，复查周期永远不会到达
+    save_source_yield_state(state)
+    if stats:
+        print_source_yield_report(stats)
+
+def print_source_yield_report(stats):
+    """按“每个有效链接的测速成本”排序输出源产出报告（成本越低越好，无产出排最后）"""
+    def cost_per_useful(st):
+        return st["probe_seconds"] / st["topk"] if st["topk"] else float('inf')
+
+    state = get_source_yield_state()
+    print("\n📈 源产出报告（按每个前K链接的测速成本升序）：")
+    for src, st in sorted(stats.items(), key=lambda x: (cost_per_useful(x[1]), -x[1]["topk"])):
+        cost = cost_per_useful(st)
+        cost_str = f"{cost:.2f}s" if cost < float('inf') else "∞"
+        entry = state.get(src, {})
+        print(f"   {cost_str:>8}/有效链接 | 贡献 {st['contributed']} | 独有 {st['unique']} | 前K {st['topk']}（记入本源 {st['credited_topk']}）"
+              f" | 测速 {st['probed']} 次 {st['probe_seconds']}s | 评分 {entry.get('score', 0)} | 连续无新增 {entry.get('zero_new_runs', 0)} 次 | {src}")
+
 def test_single_url(url, timeout):
     """
     单链接测速（每个线程独立创建 Session，避免共享带来的潜在问题）
@@ -317,17 +986,20 @@ def test_single_url(url, timeout):
     """
     # 为每个线程创建独立的 Session，避免多线程共享 Session 可能导致的异常
     session = get_requests_session()
+    probe_start = time.time()
     try:
         start_time = time.time()
         # 优先使用 HEAD 请求，若失败则尝试 GET（只读取头信息）
         try:
             with session.head(url, timeout=timeout, allow_redirects=True) as response:
+                response.raise_for_status()
                 latency = time.time() - start_time
                 return (url, round(latency, 2))
         except Exception:
             # HEAD 失败，尝试 GET（仅获取响应头，不下载正文）
             start_time = time.time()
             with session.get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
                 # 读取一点数据以确保连接真正建立
                 response.raw.read(1)  # 只读1字节，减少开销
                 latency = time.time() - start_time
@@ -336,6 +1008,7 @@ def test_single_url(url, timeout):
         return (url, float('inf'))
     finally:
         session.close()  # 显式关闭，释放连接
+        RUN_PROBE_COST[url] = time.time() - probe_start
 
 def test_urls_concurrent(urls, timeout, max_workers):
     """
@@ -345,18 +1018,434 @@ def test_urls_concurrent(urls, timeout, max_workers):
     if not urls:
         return {}
     
-    unique_urls = list(set(urls))
+    unique_urls = list(dict.fromkeys(urls))  # 去重并保持提交顺序（高产源优先）
     result_dict = {}
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         future_to_url = {executor.submit(test_single_url, url, timeout): url for url in unique_urls}
         for future in as_completed(future_to_url):
             url, latency = future.result()
+            RUN_PROBE_LOG[url] = latency
             if latency < float('inf'):
                 result_dict[url] = latency
     
     return result_dict
 
+# ===============================
+# 镜像流内容指纹去重（按源站分组测速与选优）
+# ===============================
+def get_fingerprint_state():
+    """读取指纹分组状态（结果全局缓存），过期条目直接丢弃以便重新采集"""
+    global FINGERPRINT_STATE
+    if FINGERPRINT_STATE is not None:
+        return FINGERPRINT_STATE
+
+    fp_config = CONFIG["FINGERPRINT"]
+    state_path = Path(fp_config["STATE_FILE"])
+    FINGERPRINT_STATE = {}
+    if state_path.exists():
+        try:
+            entries = json.loads(state_path.read_text(encoding="utf-8")).get("urls", {})
+            expire_before = time.time() - fp_config["EXPIRE_HOURS"] * 3600
+            FINGERPRINT_STATE = {url: entry for url, entry in entries.items() if entry.get("ts", 0) > expire_before}
+        except Exception as e:
+            print(f"⚠️  指纹状态文件损坏，已忽略：{e}")
+    return FINGERPRINT_STATE
+
+def save_fingerprint_state():
+    if not CONFIG["FINGERPRINT"]["enabled"] or FINGERPRINT_STATE is None:
+        return
+    state_path = Path(CONFIG["FINGERPRINT"]["STATE_FILE"])
+    try:
+        state_path.write_text(json.dumps({"urls": FINGERPRINT_STATE}, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    except Exception as e:
+        print(f"❌ 保存指纹状态失败：{e}")
+
+def read_playlist_text(session, url, timeout):
+    """读取播放列表正文（最多 MAX_BYTES 字节），非 m3u8 内容返回 None"""
+    with session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code >= 400:
+            return None
+        body = response.raw.read(CONFIG["FINGERPRINT"]["MAX_BYTES"], decode_content=True)
+    text = body.decode("utf-8", errors="ignore")
+    return text if "#EXTM3U" in text else None
+
+def read_media_playlist(session, url, timeout):
+    """读取媒体播放列表：主播放列表跟随第一个子流，返回 (媒体播放列表url, 正文)，失败时正文为 None"""
+    text = read_playlist_text(session, url, timeout)
+    if text and "#EXT-X-STREAM-INF" in text:
+        lines = text.splitlines()
+        variant = next((line.strip() for idx, line in enumerate(lines)
+                        if idx > 0 and lines[idx - 1].startswith("#EXT-X-STREAM-INF") and line.strip()), None)
+        if not variant:
+            return (url, None)
+        url = urljoin(url, variant)
+        text = read_playlist_text(session, url, timeout)
+    return (url, text)
+
+def fetch_playlist_fingerprint(url, timeout):
+    """
+    采集媒体播放列表指纹：主播放列表先跟随第一个子流，
+    再把 EXT-X-MEDIA-SEQUENCE 序号与分片文件名（去掉域名和参数）组合后逐个哈希
+    返回 (url, 分片键列表, 正文摘要)；非HLS或读取失败时分片键为空
+    """
+    session = get_requests_session()
+    try:
+        _, text = read_media_playlist(session, url, timeout)
+        if not text:
+            return (url, [], None)
+
+        sequence = 0
+        keys = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                sequence = int(line.split(":", 1)[1].strip() or 0)
+            elif line and not line.startswith("#"):
+                segment_name = urlparse(line).path.rsplit("/", 1)[-1]
+                keys.append(f"{sequence + len(keys)}:{segment_name}")
+        digest = hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()[:16] if keys else None
+        return (url, [hashlib.sha1(key.encode("utf-8")).hexdigest()[:12] for key in keys], digest)
+    except Exception:
+        return (url, [], None)
+    finally:
+        session.close()
+
+def url_origin(url):
+    """链接所属源站分组，未采集指纹的链接自成一组"""
+    entry = get_fingerprint_state().get(url)
+    return entry["origin"] if entry else f"url:{url}"
+
+def assign_origins(urls, timeout, max_workers):
+    """
+    为同一轮内测速成功的链接采集指纹并合并分组（并查集）：
+    直播窗口会滑动，所以只比较同一轮采集的指纹，共享分片数达到阈值即视为同源；
+    已有分组的链接参与合并时沿用原分组标识，分组结果持久化供后续运行使用
+    """
+    state = get_fingerprint_state()
+    fp_config = CONFIG["FINGERPRINT"]
+    fingerprints = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for url, keys, digest in executor.map(lambda u: fetch_playlist_fingerprint(u, timeout), urls):
+            fingerprints[url] = (keys, digest)
+    add_metric("fingerprint_fetches", len(urls))
+
+    parent = {url: url for url in urls}
+    def find(url):
+        while parent[url] != url:
+            parent[url] = parent[parent[url]]
+            url = parent[url]
+        return url
+
+    key_index = {}
+    for url, (keys, _) in fingerprints.items():
+        for key in set(keys):
+            key_index.setdefault(key, []).append(url)
+    shared_counts = {}
+    for members in key_index.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                pair = (first, second)
+                shared_counts[pair] = shared_counts.get(pair, 0) + 1
+    for (first, second), count in shared_counts.items():
+        if count >= fp_config["MIN_SHARED_SEGMENTS"]:
+            parent[find(first)] = find(second)
+
+    components = {}
+    for url in urls:
+        components.setdefault(find(url), []).append(url)
+    now = round(time.time())
+    for members in components.values():
+        old_origins = [state[url]["origin"] for url in members if url in state]
+        origin = old_origins[0] if old_origins else hashlib.sha1(members[0].encode("utf-8")).hexdigest()[:12]
+        # 两个已知分组本轮被判定同源时合并为一个
+        merged = set(old_origins) - {origin}
+        if merged:
+            for entry in state.values():
+                if entry["origin"] in merged:
+                    entry["origin"] = origin
+        for url in members:
+            entry = state.setdefault(url, {})
+            entry["origin"] = origin
+            entry["digest"] = fingerprints[url][1]
+            entry["ts"] = now
+
+def probe_by_origin(urls, timeout, max_workers, top_k):
+    """
+    按源站分组测速：每组只测最近最快的一个代表，代表失败时依次回退到组内下一个；
+    所有分组都已有可用链接但总数仍不足前K时，继续从各组补测同源镜像，直到凑满K个或组内耗尽；
+    本轮出现新链接时只为新的成功链接和每个已知分组的一个代表采集指纹，把新链接归入已有分组
+    返回字典 {url: 延迟}
+    """
+    if not CONFIG["FINGERPRINT"]["enabled"]:
+        return test_urls_concurrent(urls, timeout=timeout, max_workers=max_workers)
+
+    state = get_fingerprint_state()
+    groups = {}
+    for url in dict.fromkeys(urls):
+        groups.setdefault(url_origin(url), []).append(url)
+    # 组内按上次延迟排序（未知延迟排后，保持原有顺序）
+    queues = {origin: sorted(members, key=lambda u: state.get(u, {}).get("latency", float('inf')))
+              for origin, members in groups.items()}
+
+    latency_dict = {}
+    live_origins = set()
+    probed_count = 0
+    while True:
+        batch = {queue.pop(0): origin for origin, queue in queues.items() if queue and origin not in live_origins}
+        if not batch:
+            # 各组都已测通：不足K个时按组轮流补测同源镜像，一次补足缺口
+            need = top_k - len(latency_dict)
+            while len(batch) < need and any(queues.values()):
+                for origin, queue in queues.items():
+                    if queue and len(batch) < need:
+                        batch[queue.pop(0)] = origin
+            if not batch:
+                break
+        probed_count += len(batch)
+        results = test_urls_concurrent(list(batch), timeout=timeout, max_workers=max_workers)
+        latency_dict.update(results)
+        live_origins.update(batch[url] for url in results)
+    add_metric("fingerprint_skipped_probes", sum(len(members) for members in groups.values()) - probed_count)
+
+    new_ok = [url for url in latency_dict if url not in state]
+    if new_ok:
+        # 每个已知分组只取本轮最快的一个成功链接作代表，与新链接一起采集比对
+        representatives = {}
+        for url in sorted(latency_dict, key=lambda u: (latency_dict[u], u)):
+            if url in state:
+                representatives.setdefault(state[url]["origin"], url)
+        assign_origins(new_ok + list(representatives.values()), timeout, max_workers)
+    for url, latency in latency_dict.items():
+        if url in state:
+            state[url]["latency"] = latency
+    return latency_dict
+
+def select_top_by_origin(latency_dict, top_k):
+    """按延迟升序选取前K：优先选择不同源站，不足K个时再用同源镜像补齐"""
+    sorted_items = sorted(latency_dict.items(), key=lambda x: (x[1], x[0]))  # 延迟相同时按url排序，保证结果稳定
+    if not CONFIG["FINGERPRINT"]["enabled"]:
+        return sorted_items[:top_k]
+    selected, leftovers, seen_origins = [], [], set()
+    for url, latency in sorted_items:
+        origin = url_origin(url)
+        if origin in seen_origins:
+            leftovers.append((url, latency))
+        else:
+            seen_origins.add(origin)
+            selected.append((url, latency))
+    return (selected + leftovers)[:top_k]
+
+# ===============================
+# 分层测速（TCP初筛 / HLS深度检查）
+# ===============================
+FAMILY_NAMES = {socket.AF_INET: "ipv4", socket.AF_INET6: "ipv6"}
+
+def resolve_endpoints(endpoints):
+    """
+    并发解析所有主机端口的地址（线程池批量，命中共享DNS缓存时直接返回）
+    返回字典 {(主机名, 端口): getaddrinfo 结果}，解析失败或超时为空列表
+    """
+    dns_config = CONFIG["DNS_CACHE"]
+    resolved = {endpoint: [] for endpoint in endpoints}
+    if not endpoints:
+        return resolved
+
+    def lookup(endpoint):
+        try:
+            return endpoint, socket.getaddrinfo(endpoint[0], endpoint[1], 0, socket.SOCK_STREAM)
+        except OSError:
+            return endpoint, []
+
+    rounds = -(-len(endpoints) // dns_config["MAX_WORKERS"])
+    executor = ThreadPoolExecutor(max_workers=dns_config["MAX_WORKERS"])
+    futures = [executor.submit(lookup, endpoint) for endpoint in endpoints]
+    done, _ = wait(futures, timeout=rounds * 2 * dns_config["TIMEOUT"] + 1)
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        endpoint, infos = future.result()
+        resolved[endpoint] = infos
+    return resolved
+
+def tcp_connect_screen(endpoints):
+    """
+    第一层：非阻塞TCP连接初筛（selectors 单线程驱动，大量并发连接）
+    endpoints 为 {(主机名, 端口)}，地址先经线程池批量解析（共享DNS缓存）；开启 DUAL_STACK 时
+    IPv4 与 IPv6 同时发起连接（Happy Eyeballs 式竞速），分别记录耗时；
+    某个地址连接失败时回退到同一地址族的下一个地址，全部失败才记为不可连接
+    返回字典 {(主机名, 端口): {"ipv4": 连接耗时, "ipv6": 连接耗时}}，失败为 inf，无该族地址则不含该键，解析不到任何地址时为空字典
+    """
+    tcp_config = CONFIG["PROBE_TIERS"]["TCP"]
+    timeout = tcp_config["TIMEOUT"]
+    results = {}
+    pending = []  # 每项为 (主机端口, 地址族名, [待尝试的 (family, type, proto, sockaddr)])
+    for endpoint, infos in resolve_endpoints(endpoints).items():
+        results[endpoint] = {}
+        by_family = {}
+        for family, sock_type, proto, _, sockaddr in infos:
+            if family in FAMILY_NAMES:
+                by_family.setdefault(family, []).append((family, sock_type, proto, sockaddr))
+        for family, addresses in by_family.items():
+            pending.append((endpoint, FAMILY_NAMES[family], addresses))
+            if not tcp_config["DUAL_STACK"]:
+                break
+
+    selector = selectors.DefaultSelector()
+    in_flight = {}  # socket -> (主机端口, 地址族名, 剩余地址, 开始时间)
+
+    def fail(endpoint, family_name, addresses):
+        """当前地址失败：同族还有地址则排队重试，否则记为不可连接"""
+        if addresses:
+            pending.append((endpoint, family_name, addresses))
+        else:
+            results[endpoint][family_name] = float('inf')
+
+    while pending or in_flight:
+        while pending and len(in_flight) < tcp_config["MAX_CONCURRENCY"]:
+            endpoint, family_name, addresses = pending.pop()
+            family, sock_type, proto, sockaddr = addresses[0]
+            try:
+                sock = socket.socket(family, sock_type, proto)
+            except OSError:
+                fail(endpoint, family_name, addresses[1:])
+                continue
+            sock.setblocking(False)
+            err = sock.connect_ex(sockaddr)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                sock.close()
+                fail(endpoint, family_name, addresses[1:])
+                continue
+            selector.register(sock, selectors.EVENT_WRITE)
+            in_flight[sock] = (endpoint, family_name, addresses[1:], time.time())
+
+        if not in_flight:
+            continue
+        nearest_deadline = min(start for _, _, _, start in in_flight.values()) + timeout
+        for key, _ in selector.select(timeout=max(0, nearest_deadline - time.time())):
+            sock = key.fileobj
+            endpoint, family_name, rest, start = in_flight.pop(sock)
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            selector.unregister(sock)
+            sock.close()
+            if err == 0:
+                results[endpoint][family_name] = time.time() - start
+            else:
+                fail(endpoint, family_name, rest)
+
+        now = time.time()
+        for sock, (endpoint, family_name, rest, start) in list(in_flight.items()):
+            if now - start >= timeout:
+                del in_flight[sock]
+                selector.unregister(sock)
+                sock.close()
+                fail(endpoint, family_name, rest)
+
+    selector.close()
+    return results
+
+def preferred_family(family_latency):
+    """返回连接更快的地址族名（"ipv4"/"ipv6"），均不可连接时返回 None"""
+    reachable = {name: latency for name, latency in family_latency.items() if latency < float('inf')}
+    return min(reachable, key=reachable.get) if reachable else None
+
+def prefer_family_in_dns_cache(host, family_name):
+    """把更快地址族的地址排到缓存最前，后续HTTP测速与播放优先走该地址族"""
+    family = socket.AF_INET6 if family_name == "ipv6" else socket.AF_INET
+    with DNS_CACHE_LOCK:
+        entry = DNS_CACHE.get(host)
+        if entry and entry["addrs"]:
+            entry["addrs"] = sorted(entry["addrs"], key=lambda addr: addr[0] != family)
+
+def screen_channels_by_tcp(channels):
+    """
+    对所有频道的链接按 (主机, 端口) 去重后统一做TCP初筛，剔除不可连接的链接（原地修改）
+    被剔除的链接记为测速失败，参与黑名单学习；
+    DNS解析不到地址的主机无法判断可达性，原样交给HTTP测速，不计入失败
+    """
+    if not CONFIG["PROBE_TIERS"]["TCP"]["enabled"]:
+        return
+    endpoints = {url_endpoint(url) for urls in channels.values() for url in urls}
+    endpoints.discard((None, None))
+    print(f"🔌 TCP初筛：共 {len(endpoints)} 个主机端口（并发数：{CONFIG['PROBE_TIERS']['TCP']['MAX_CONCURRENCY']}，超时：{CONFIG['PROBE_TIERS']['TCP']['TIMEOUT']}s）")
+    start_time = time.time()
+    connect_results = tcp_connect_screen(endpoints)
+    alive = set()
+    unresolved = set()
+    family_wins = {"ipv4": 0, "ipv6": 0}
+    for endpoint, family_latency in connect_results.items():
+        if not family_latency:
+            unresolved.add(endpoint)
+            continue
+        family_name = preferred_family(family_latency)
+        ENDPOINT_FAMILY_LATENCY[endpoint] = {name: (round(latency, 4) if latency < float('inf') else None)
+                                             for name, latency in family_latency.items()}
+        # 记录按原始耗时选定的地址族，JSON输出直接使用，与DNS缓存排序保持一致
+        ENDPOINT_FAMILY_LATENCY[endpoint]["preferred"] = family_name
+        if family_name is None:
+            continue
+        alive.add(endpoint)
+        if len(family_latency) > 1:
+            family_wins[family_name] += 1
+            prefer_family_in_dns_cache(endpoint[0], family_name)
+
+    dropped = 0
+    for std_ch, urls in channels.items():
+        kept = []
+        for url in urls:
+            if url_endpoint(url) in alive or url_endpoint(url) in unresolved:
+                kept.append(url)
+            else:
+                RUN_PROBE_LOG[url] = float('inf')
+                dropped += 1
+        channels[std_ch] = kept
+
+    elapsed = time.time() - start_time
+    add_metric("tcp_endpoints", len(endpoints))
+    add_metric("tcp_alive_endpoints", len(alive))
+    add_metric("tcp_unresolved_endpoints", len(unresolved))
+    add_metric("tcp_dropped_urls", dropped)
+    add_metric("tcp_seconds", elapsed)
+    add_metric("dual_stack_ipv4_faster", family_wins["ipv4"])
+    add_metric("dual_stack_ipv6_faster", family_wins["ipv6"])
+    print(f"✅ TCP初筛完成：可连接 {len(alive)}/{len(endpoints)} 个主机端口（{len(unresolved)} 个未解析，交由HTTP测速），剔除 {dropped} 个链接，耗时 {elapsed:.2f}s\n")
+
+def test_hls_stream(url, timeout):
+    """
+    第三层：HLS深度检查（读取媒体播放列表并下载首个分片的开头）
+    非m3u8链接不做深度检查，直接视为通过
+    返回 (url, 是否通过)
+    """
+    session = get_requests_session()
+    try:
+        media_url, text = read_media_playlist(session, url, timeout)
+        if text is None:
+            return (url, "m3u8" not in url.lower())
+        segment = next((line.strip() for line in text.splitlines() if line.strip() and not line.startswith("#")), None)
+        if not segment:
+            return (url, False)
+        with session.get(urljoin(media_url, segment), timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            return (url, bool(response.raw.read(188)))  # 一个TS包大小
+    except Exception:
+        return (url, False)
+    finally:
+        session.close()
+
+def deep_check_contenders(latency_dict, top_k):
+    """对前K候选做HLS深度检查，剔除播放列表或分片不可用的链接，返回过滤后的 {url: 延迟}"""
+    hls_config = CONFIG["PROBE_TIERS"]["HLS"]
+    if not hls_config["enabled"] or not latency_dict:
+        return latency_dict
+    candidates = [url for url, _ in select_top_by_origin(latency_dict, top_k * hls_config["CANDIDATES_FACTOR"])]
+    failed = set()
+    with ThreadPoolExecutor(max_workers=hls_config["MAX_WORKERS"]) as executor:
+        for url, ok in executor.map(lambda u: test_hls_stream(u, hls_config["TIMEOUT"]), candidates):
+            if not ok:
+                failed.add(url)
+    add_metric("hls_checked", len(candidates))
+    add_metric("hls_failed", len(failed))
+    return {url: latency for url, latency in latency_dict.items() if url not in failed}
+
 def read_iptv_sources_from_txt():
     """读取 iptv_sources.txt 中的有效链接（自动去重）"""
     txt_path = Path(CONFIG["SOURCE_TXT_FILE"])
@@ -409,6 +1498,8 @@ def read_standalone_m3u8_links():
             if not (line.startswith(("http://", "https://")) and (line.endswith(".m3u8") or "m3u8" in line)):
                 print(f"⚠️  第{line_num}行不是有效m3u8链接，已跳过：{line}")
                 continue
+            if not is_valid_url(line):
+                continue
             
             # 从URL中提取频道名
             match = URL_CHANNEL_PATTERN.search(line)
@@ -457,6 +1548,8 @@ def parse_zubo_source(content):
         
         ch_name = match.group(1).strip()
         play_url = match.group(2).strip()
+        if not is_valid_url(play_url):
+            continue
         
         # 新增：先标准化CCTV名称，再匹配别名
         normalized_name = normalize_cctv_name(ch_name)
@@ -490,6 +1583,9 @@ def parse_standard_m3u8(content):
             ch_match = re.search(r",(.*)$", line)
             current_ch = ch_match.group(1).strip() if ch_match else None
         elif line.startswith(("http://", "https://")) and current_ch:
+            if not is_valid_url(line):
+                current_ch = None
+                continue
             # 新增：先标准化CCTV名称，再匹配别名
             normalized_name = normalize_cctv_name(current_ch)
             std_ch = alias_map.get(normalized_name, alias_map.get(current_ch, normalized_name))
@@ -514,6 +1610,7 @@ def crawl_and_merge_sources(session):
     
     # 第一步：读取独立m3u8链接并加入合并
     standalone_channels = read_standalone_m3u8_links()
+    record_provenance(CONFIG["M3U8_SOURCES_FILE"], standalone_channels)
     for std_ch, urls in standalone_channels.items():
         if std_ch not in all_raw_channels:
             all_raw_channels[std_ch] = set()
@@ -525,6 +1622,9 @@ def crawl_and_merge_sources(session):
 
     # 第二步：爬取远程源
     for source_url in source_urls:
+        if should_skip_source(source_url):
+            print(f"⏭️  跳过低产源（连续多次无独有有效链接）：{source_url}\n")
+            continue
         print(f"🔍 正在爬取源：{source_url}")
         try:
             response = session.get(source_url, timeout=CONFIG["TEST_TIMEOUT"] + 2)
@@ -539,6 +1639,7 @@ def crawl_and_merge_sources(session):
                 source_channels = parse_standard_m3u8(content)
 
             # 合并到总字典（自动去重）
+            record_provenance(source_url, source_channels)
             for std_ch, urls in source_channels.items():
                 if std_ch not in all_raw_channels:
                     all_raw_channels[std_ch] = set()
@@ -553,6 +1654,16 @@ def crawl_and_merge_sources(session):
     for std_ch, url_set in all_raw_channels.items():
         all_raw_channels[std_ch] = list(url_set)
 
+    blocked_count = build_blacklist()["blocked_count"]
+    if blocked_count:
+        print(f"🚫 黑名单在解析阶段拦截 {blocked_count} 个链接（不进入测速队列）")
+
+    # 解析完成后立即批量预解析DNS，并剔除NXDOMAIN主机
+    if CONFIG["DNS_CACHE"]["enabled"]:
+        prefetch_dns(url for urls in all_raw_channels.values() for url in urls)
+        drop_unresolvable_urls(all_raw_channels)
+        all_raw_channels = {std_ch: urls for std_ch, urls in all_raw_channels.items() if urls}
+
     if not all_raw_channels:
         print("❌ 未爬取/读取到任何频道数据")
     return all_raw_channels
@@ -567,6 +1678,9 @@ def crawl_and_select_top3(session):
     if not raw_channels:
         return all_channels
 
+    # 第一层：TCP初筛，后续HTTP测速只针对可连接的链接
+    screen_channels_by_tcp(raw_channels)
+
     print(f"🚀 开始并发测速（共{len(raw_channels)}个频道，最大并发数：{CONFIG['MAX_WORKERS']}）")
     valid_channel_count = 0
     top_k = CONFIG["TOP_K"]
@@ -585,12 +1699,21 @@ def crawl_and_select_top3(session):
             timeout = CONFIG["TEST_TIMEOUT"]
             max_workers = CONFIG["MAX_WORKERS"]
 
-        latency_dict = test_urls_concurrent(urls, timeout=timeout, max_workers=max_workers)
+        urls, deferred_urls = plan_probe_urls(urls)
+        latency_dict = probe_by_origin(urls, timeout=timeout, max_workers=max_workers, top_k=top_k)
+        add_metric("yield_deferred_urls", len(deferred_urls))
+        if deferred_urls and len(latency_dict) < top_k:
+            # 首批不足前K时才动用低产源延后链接的测速预算
+            add_metric("yield_deferred_probed_urls", len(deferred_urls))
+            latency_dict.update(probe_by_origin(deferred_urls, timeout=timeout, max_workers=max_workers,
+                                                top_k=top_k - len(latency_dict)))
+        latency_dict = deep_check_contenders(latency_dict, top_k)
         if not latency_dict:
             continue
 
-        sorted_items = sorted(latency_dict.items(), key=lambda x: x[1])
-        top3_urls = [url for url, _ in sorted_items[:top_k]]
+        CHANNEL_CANDIDATES[ch_name] = latency_dict
+        sorted_items = select_top_by_origin(latency_dict, top_k)
+        top3_urls = [url for url, _ in sorted_items]
         all_channels[ch_name] = top3_urls
         valid_channel_count += 1
 
@@ -601,15 +1724,28 @@ def crawl_and_select_top3(session):
     print(f"\n🎯 测速完成：共筛选出 {valid_channel_count} 个有效频道（原{len(raw_channels)}个），每个频道保留最多{top_k}个源")
     return all_channels
 
-def generate_iptv_playlist(top3_channels):
+def write_output_if_changed(output_path, text, header_lines=0):
+    """
+    输出文件不存在或内容有变化时才写入（比较时忽略前 header_lines 行，如更新时间），
+    返回 True 表示已写入，False 表示内容未变；写入失败时抛出异常
+    """
+    if output_path.exists():
+        old_lines = output_path.read_text(encoding="utf-8").split("\n")
+        if old_lines[header_lines:] == text.split("\n")[header_lines:]:
+            return False
+    output_path.write_text(text, encoding="utf-8")
+    return True
+
+def generate_iptv_playlist(top3_channels, output_file=None):
     """
-    生成带分类和延迟标记的 m3u8 播放列表
+    生成带分类和延迟标记的 m3u8 播放列表（默认写入 OUTPUT_FILE），频道内容未变时不重写
+    返回 True 表示文件已是最新（已写入或无需写入），False 表示未能生成
     """
     if not top3_channels:
         print("❌ 无有效频道，无法生成播放列表")
-        return
+        return False
 
-    output_path = Path(CONFIG["OUTPUT_FILE"])
+    output_path = Path(output_file or CONFIG["OUTPUT_FILE"])
     beijing_now = datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d %H:%M:%S")
     playlist_content = [
         f"更新时间: {beijing_now}（北京时间）",
@@ -618,6 +1754,7 @@ def generate_iptv_playlist(top3_channels):
         f"{beijing_now},{CONFIG['IPTV_DISCLAIMER']}",
         ""
     ]
+    header_lines = len(playlist_content)  # 头部含更新时间，比较内容变化时忽略
     top_k = CONFIG["TOP_K"]
 
     # 按分类写入
@@ -656,12 +1793,194 @@ def generate_iptv_playlist(top3_channels):
 
     # 保存文件
     try:
-        output_path.write_text("\n".join(playlist_content).rstrip("\n"), encoding="utf-8")
+        if not write_output_if_changed(output_path, "\n".join(playlist_content).rstrip("\n"), header_lines):
+            print(f"\n💤 播放列表内容未变化，保持原文件：{output_path.name}")
+            return True
         print(f"\n🎉 成功生成最优播放列表：{output_path.name}")
         print(f"📂 路径：{output_path.absolute()}")
         print(f"💡 说明：1. 未分类频道已统一改为“其它频道”；2. 每个频道保留最多{top_k}个源，标记为$最优/$次优/$三优；3. txt源的运营商信息已保留（如$上海市电信），方便按网络选择")
+        return True
     except Exception as e:
         print(f"❌ 生成文件失败：{e}")
+        return False
+
+def url_family_info(url):
+    """
+    链接所在主机端口的各地址族是否可连接与TCP初筛选定的更快地址族
+    只输出稳定的结论，不含每轮都会波动的连接耗时；未经TCP初筛的主机各项均为 None
+    """
+    family_latency = ENDPOINT_FAMILY_LATENCY.get(url_endpoint(url))
+    if family_latency is None:
+        return {"ipv4": None, "ipv6": None, "family": None}
+    return {
+        "ipv4": family_latency.get("ipv4") is not None,
+        "ipv6": family_latency.get("ipv6") is not None,
+        "family": family_latency.get("preferred")
+    }
+
+def generate_playlist_json(top3_channels):
+    """
+    生成前K结果的JSON明细：排名、各地址族是否可连接、更快的地址族
+    本轮延迟等测量值每次都不同，不写入文件，排序与发布字段不变时文件保持不变
+    """
+    if not top3_channels:
+        return
+    output_path = Path(CONFIG["OUTPUT_JSON_FILE"])
+    channels = {}
+    for std_ch, urls in top3_channels.items():
+        channels[std_ch] = [
+            {"rank": idx + 1, "url": url, **url_family_info(url)}
+            for idx, url in enumerate(urls)
+        ]
+    try:
+        if write_output_if_changed(output_path, json.dumps({"channels": channels}, ensure_ascii=False, indent=1)):
+            print(f"🧾 已生成JSON明细：{output_path.name}")
+    except Exception as e:
+        print(f"❌ 生成JSON明细失败：{e}")
+
+def generate_family_playlists():
+    """按地址族单独排序生成播放列表：只保留该地址族可连接的候选，按该地址族连接耗时选前K"""
+    family_config = CONFIG["FAMILY_PLAYLISTS"]
+    if not family_config["enabled"]:
+        return
+    top_k = CONFIG["TOP_K"]
+    for family_name in ("ipv4", "ipv6"):
+        family_channels = {}
+        for std_ch, latency_dict in CHANNEL_CANDIDATES.items():
+            family_latency = {}
+            for url in latency_dict:
+                latency = ENDPOINT_FAMILY_LATENCY.get(url_endpoint(url), {}).get(family_name)
+                if latency is not None:
+                    family_latency[url] = latency
+            if family_latency:
+                family_channels[std_ch] = [url for url, _ in select_top_by_origin(family_latency, top_k)]
+        print(f"\n🌐 {family_name.upper()} 专用播放列表：{len(family_channels)} 个频道")
+        generate_iptv_playlist(family_channels, output_file=family_config[family_name])
+
+# ===============================
+# 增量变更推送（快照 + 带序号的JSON Patch变更流）
+# ===============================
+def json_pointer(channel):
+    """RFC 6901 路径转义"""
+    return "/channels/" + channel.replace("~", "~0").replace("/", "~1")
+
+def write_text_atomic(path, text):
+    """先写入同目录临时文件再原子替换，避免中途失败留下半截文件"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def load_snapshot():
+    """读取上次发布的快照，不存在或损坏时返回空快照（序号0）"""
+    snapshot_path = Path(CONFIG["SNAPSHOT_FILE"])
+    if snapshot_path.exists():
+        try:
+            snapshot = json.loads(snapshot_path.read_text(encoding="utf-8"))
+            return {"seq": snapshot.get("seq", 0), "channels": snapshot.get("channels", {})}
+        except Exception as e:
+            print(f"⚠️  快照文件损坏，将按首次运行处理：{e}")
+    return {"seq": 0, "channels": {}}
+
+def load_feed_entries():
+    """读取变更流条目，不存在或损坏时返回空列表"""
+    feed_path = Path(CONFIG["FEED_FILE"])
+    if feed_path.exists():
+        try:
+            return json.loads(feed_path.read_text(encoding="utf-8")).get("entries", [])
+        except Exception as e:
+            print(f"⚠️  变更流文件损坏，已重新开始：{e}")
+    return []
+
+def apply_patch(channels, patch):
+    """把 diff_channels 生成的 JSON Patch（仅含频道级 add/remove/replace）应用到频道字典"""
+    channels = dict(channels)
+    for op in patch:
+        channel = op["path"][len("/channels/"):].replace("~1", "/").replace("~0", "~")
+        if op["op"] == "remove":
+            channels.pop(channel, None)
+        else:
+            channels[channel] = op["value"]
+    return channels
+
+def diff_channels(old_channels, new_channels):
+    """
+    计算两次排序结果的差异
+    返回 (JSON Patch 操作列表, 语义化变更)：新增/移除频道，链接新增(added)/提升(promoted)/下降(demoted)/移除(dropped)
+    """
+    patch = []
+    changes = {"channels_added": [], "channels_removed": [], "added": [], "promoted": [], "demoted": [], "dropped": []}
+    for channel in sorted(old_channels.keys() - new_channels.keys()):
+        patch.append({"op": "remove", "path": json_pointer(channel)})
+        changes["channels_removed"].append(channel)
+    for channel in sorted(new_channels.keys() - old_channels.keys()):
+        patch.append({"op": "add", "path": json_pointer(channel), "value": new_channels[channel]})
+        changes["channels_added"].append(channel)
+
+    for channel in sorted(old_channels.keys() & new_channels.keys()):
+        old_urls, new_urls = old_channels[channel], new_channels[channel]
+        if old_urls == new_urls:
+            continue
+        patch.append({"op": "replace", "path": json_pointer(channel), "value": new_urls})
+        old_ranks = {url: idx + 1 for idx, url in enumerate(old_urls)}
+        for idx, url in enumerate(new_urls):
+            rank = idx + 1
+            if url not in old_ranks:
+                changes["added"].append([channel, url, rank])
+            elif rank < old_ranks[url]:
+                changes["promoted"].append([channel, url, old_ranks[url], rank])
+            elif rank > old_ranks[url]:
+                changes["demoted"].append([channel, url, old_ranks[url], rank])
+        for url in old_urls:
+            if url not in new_urls:
+                changes["dropped"].append([channel, url, old_ranks[url]])
+
+    return patch, {kind: items for kind, items in changes.items() if items}
+
+def publish_delta(top3_channels):
+    """
+    与上次发布的结果比较并发布增量：有变化时序号+1，追加变更流条目并写入新快照，返回 True；
+    无变化或写入失败时返回 False（须在播放列表写入成功后调用，保证每个增量都有对应的播放列表）
+    两个文件都原子替换，先变更流后快照；若上次快照写入失败导致变更流领先，先按变更流补齐再比较，序号不会重复
+    """
+    snapshot = load_snapshot()
+    entries = load_feed_entries()
+    base_seq, base_channels = snapshot["seq"], snapshot["channels"]
+    for entry in entries:
+        if entry["seq"] == base_seq + 1:
+            base_channels = apply_patch(base_channels, entry["patch"])
+            base_seq = entry["seq"]
+
+    patch, changes = diff_channels(base_channels, top3_channels)
+    if not patch and base_seq == snapshot["seq"]:
+        print("\n💤 排序结果与上次完全一致，不发布增量")
+        return False
+
+    beijing_now = datetime.now(timezone(timedelta(hours=8))).isoformat(timespec="seconds")
+    seq = base_seq
+    if patch:
+        seq = base_seq + 1
+        entry = {"seq": seq, "base_seq": base_seq, "generated_at": beijing_now, "patch": patch, "changes": changes}
+        # 只保留最近 FEED_MAX_ENTRIES 条，落后更多的客户端直接拉取快照
+        entries = (entries + [entry])[-CONFIG["FEED_MAX_ENTRIES"]:]
+    feed = {"latest_seq": seq, "oldest_seq": entries[0]["seq"], "entries": entries}
+
+    try:
+        if patch:
+            write_text_atomic(Path(CONFIG["FEED_FILE"]), json.dumps(feed, ensure_ascii=False, separators=(",", ":")))
+        write_text_atomic(
+            Path(CONFIG["SNAPSHOT_FILE"]),
+            json.dumps({"seq": seq, "generated_at": beijing_now, "channels": top3_channels}, ensure_ascii=False, indent=1)
+        )
+    except Exception as e:
+        print(f"❌ 写入增量变更失败：{e}")
+        return False
+
+    if not patch:
+        print(f"\n🩹 已按变更流补齐快照至 #{seq}，排序结果无新变化")
+        return False
+    summary = "，".join(f"{kind} {len(items)}" for kind, items in changes.items())
+    print(f"\n📮 已发布增量 #{seq}（基于 #{base_seq}）：{summary}")
+    return True
 
 
 # ===============================
@@ -676,8 +1995,18 @@ if __name__ == "__main__":
     # 创建全局 Session（用于爬取源，测速时每个线程会创建独立 Session）
     session = get_requests_session()
     build_alias_map()  # 预热别名缓存
+    build_blacklist()  # 预编译黑名单（含自学习条目）
+    install_dns_cache()  # 启用共享DNS缓存（爬取源与测速共用）
 
     top3_channels = crawl_and_select_top3(session)
-    generate_iptv_playlist(top3_channels)
+    # 各输出文件仅在自身内容变化或文件缺失时重写；播放列表写入成功后才发布增量
+    if generate_iptv_playlist(top3_channels):
+        publish_delta(top3_channels)
+    generate_playlist_json(top3_channels)
+    generate_family_playlists()
+    update_source_yield(top3_channels)
+    save_fingerprint_state()
+    update_blacklist_state(RUN_PROBE_LOG)
+    print_run_metrics()
 
     print("\n✨ 任务完成！万事顺遂")